@@ -18,7 +18,8 @@ from models.funcational_connectivity_gcn import (
     validate_connectivity_matrix,
     create_connection_table,
     predict_connectivity,
-    get_region_coordinates
+    get_region_coordinates,
+    INFERENCE_BACKENDS
 )
 
 # Configure logging
@@ -26,14 +27,23 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s: %(mes
 logger = logging.getLogger(__name__)
 
 class FunctionalConnectivityProcessor:
-    def __init__(self, model_path: Optional[str] = None):
+    def __init__(self, model_path: Optional[str] = None, backend: str = 'eager',
+                 quantize: bool = False, max_deviation: Optional[float] = None):
         """
         Initialize the processor.
         
         Args:
             model_path: Path to the pre-trained model file (.pth) or notebook (.ipynb)
+            backend: Inference backend ('eager', 'torchscript' or 'onnx')
+            quantize: Apply dynamic int8 quantization to the linear layers
+            max_deviation: Maximum allowed absolute deviation from the eager model
         """
+        if backend not in INFERENCE_BACKENDS:
+            raise ValueError(f"Unknown inference backend: {backend}, expected one of {INFERENCE_BACKENDS}")
         self.model_path = model_path
+        self.backend = backend
+        self.quantize = quantize
+        self.max_deviation = max_deviation
         # Load Harvard-Oxford subcortical atlas
         self.atlas = datasets.fetch_atlas_harvard_oxford('sub-maxprob-thr25-2mm')
         self.atlas_filename = self.atlas.maps
@@ -57,7 +67,13 @@ class FunctionalConnectivityProcessor:
             
             # Process the NIfTI file using our GCN model
             logger.info("Processing fMRI data with GCN model...")
-            result = predict_connectivity(nifti_file_path, ipynb_path=self.model_path)
+            result = predict_connectivity(
+                nifti_file_path,
+                ipynb_path=self.model_path,
+                backend=self.backend,
+                quantize=self.quantize,
+                max_deviation=self.max_deviation
+            )
             
             connectivity_matrix = np.array(result['connectivity_matrix'])
             region_labels = result.get('region_names', [f'Region_{i}' for i in range(connectivity_matrix.shape[0])])
@@ -116,7 +132,8 @@ class FunctionalConnectivityProcessor:
                 'max_connectivity': float(np.max(connectivity_matrix)),
                 'min_connectivity': float(np.min(connectivity_matrix)),
                 'num_regions': connectivity_matrix.shape[0],
-                'connection_table': connection_table.to_dict('records')
+                'connection_table': connection_table.to_dict('records'),
+                'backend': result['metrics'].get('backend')
             }
             
             logger.info("Successfully completed processing NIfTI file")
@@ -25,7 +25,15 @@ if not os.path.exists(MODEL_FOLDER):
 
 # Initialize processor with model path
 MODEL_PATH = os.path.join(MODEL_FOLDER, 'FC_Other_Models.ipynb')
-processor = FunctionalConnectivityProcessor(MODEL_PATH)
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', 'eager')  # eager, torchscript or onnx
+QUANTIZE = os.environ.get('QUANTIZE', 'false').lower() in ('1', 'true', 'yes')
+MAX_DEVIATION = float(os.environ['MAX_DEVIATION']) if os.environ.get('MAX_DEVIATION') else None
+processor = FunctionalConnectivityProcessor(
+    MODEL_PATH,
+    backend=INFERENCE_BACKEND,
+    quantize=QUANTIZE,
+    max_deviation=MAX_DEVIATION
+)
 
 def allowed_file(filename):
     """Check if the file has an allowed extension."""
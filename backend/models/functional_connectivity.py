@@ -8,9 +8,14 @@ Original file is located at
 """
 
 # Install dependencies
-!pip install nilearn torch torch-geometric nibabel numpy scipy matplotlib nbformat
+# !pip install nilearn torch torch-geometric nibabel numpy scipy matplotlib nbformat
 
 import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 import numpy as np
 import torch
 import torch.nn as nn
@@ -19,7 +24,6 @@ import nibabel as nib
 from nilearn import input_data, datasets
 from scipy.stats import zscore
 import matplotlib.pyplot as plt
-from google.colab import files
 import logging
 import nbformat
 import json
@@ -179,44 +183,363 @@ def parse_ipynb_model(ipynb_path):
             "Please run the .ipynb to generate a .pth file or share the model code."
         )
 
-def predict_connectivity(nifti_path, ipynb_path=None):
+INFERENCE_BACKENDS = ('eager', 'torchscript', 'onnx')
+
+# Models and optimized backends are kept in small LRU caches per worker.
+# Building a backend (trace or ONNX export plus the timed accuracy check)
+# happens on the first request for a given model and input shape, so that
+# request pays the warm-up cost; scans with new lengths evict older entries.
+CACHE_SIZE = 4
+_model_cache = OrderedDict()
+_backend_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cached(cache, key, build):
+    """Return ``cache[key]``, calling ``build()`` on a miss and evicting the least recently used entry."""
+    with _cache_lock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+        value = build()
+        cache[key] = value
+        if len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+        return value
+
+def clear_caches():
+    """Drop all cached models and inference backends."""
+    with _cache_lock:
+        _model_cache.clear()
+        _backend_cache.clear()
+
+def quantize_model(model):
     """
-    Predict connectivity matrix using model from .ipynb.
+    Apply dynamic int8 quantization to the linear layers of a model.
+
+    Only ``nn.Linear`` modules (the ``fc`` head) are swapped for int8 kernels;
+    the GCNConv layers keep float weights.
 
     Args:
-        nifti_path (str): Path to NIfTI file
-        ipynb_path (str, optional): Path to .ipynb file
+        model (nn.Module): Eager model in eval mode
+
+    Returns:
+        model (nn.Module): Quantized copy of the model (CPU only)
+    """
+    return torch.ao.quantization.quantize_dynamic(
+        model.cpu(), {nn.Linear}, dtype=torch.qint8
+    )
+
+def _eager_runner(model):
+    """Wrap an eager model as a (features, edge_index) -> numpy function."""
+    def run(x, edges):
+        with torch.no_grad():
+            return model(x.cpu(), edges.cpu()).numpy()
+    return run
+
+def _split_fc_gemm(onnx_model):
+    """
+    Rewrite the fc layer of an exported graph as MatMul + Add.
+
+    ONNX Runtime only quantizes MatMul dynamically, while ``nn.Linear``
+    exports as Gemm.
 
     Returns:
-        dict: Connectivity matrix, metrics, heatmap
+        str: Name of the fc MatMul node
+    """
+    from onnx import helper, numpy_helper
+
+    graph = onnx_model.graph
+    weights = {init.name: init for init in graph.initializer}
+    for index, node in enumerate(graph.node):
+        if node.op_type == 'Gemm' and 'fc.weight' in node.input:
+            x, weight, bias = node.input
+            trans_b = any(attr.name == 'transB' and attr.i for attr in node.attribute)
+            w = numpy_helper.to_array(weights[weight])
+            weights[weight].CopyFrom(numpy_helper.from_array(np.ascontiguousarray(w.T if trans_b else w), weight))
+            matmul = helper.make_node('MatMul', [x, weight], ['/fc/MatMul_output_0'], name='/fc/MatMul')
+            add = helper.make_node('Add', [matmul.output[0], bias], list(node.output), name='/fc/Add')
+            graph.node.remove(node)
+            graph.node.insert(index, add)
+            graph.node.insert(index, matmul)
+            return matmul.name
+    raise ValueError("Could not find the fc layer in the exported ONNX graph")
+
+def _export_onnx(model, features, edge_index, quantize, export_dir):
     """
+    Export a model to ONNX and return the serialized graph.
+
+    Files are written to a private temporary directory so concurrent workers
+    never load each other's graphs; they are copied to ``export_dir`` only
+    when one is given.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        onnx_path = os.path.join(tmp_dir, 'gcn_connectivity.onnx')
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (features, edge_index),
+                onnx_path,
+                input_names=['features', 'edge_index'],
+                output_names=['connectivity'],
+                dynamic_axes={'edge_index': {1: 'n_edges'}},
+                opset_version=16
+            )
+        if quantize:
+            import onnx
+            from onnxruntime.quantization import quantize_dynamic, QuantType
+
+            # Match the torch backends: quantize only the fc head
+            fc_model = onnx.load(onnx_path)
+            fc_node = _split_fc_gemm(fc_model)
+            fc_path = os.path.join(tmp_dir, 'gcn_connectivity.fc.onnx')
+            onnx.save(fc_model, fc_path)
+            quantized_path = os.path.join(tmp_dir, 'gcn_connectivity.int8.onnx')
+            # optimize_model would fuse the fc MatMul + Add back into a Gemm
+            quantize_dynamic(fc_path, quantized_path, nodes_to_quantize=[fc_node],
+                             weight_type=QuantType.QInt8, optimize_model=False)
+            onnx_path = quantized_path
+
+        if export_dir:
+            os.makedirs(export_dir, exist_ok=True)
+            shutil.copy(onnx_path, export_dir)
+            logger.info(f"Saved ONNX graph: {os.path.join(export_dir, os.path.basename(onnx_path))}")
+
+        with open(onnx_path, 'rb') as f:
+            return f.read()
+
+def build_inference_backend(model, features, edge_index, backend='eager',
+                            quantize=False, export_dir=None):
+    """
+    Export a GCNConnectivity model to an optimized CPU inference backend.
+
+    The whole forward pass, including the GCNConv layers and the
+    ``(x + x.T) / 2`` symmetrization, is captured in a single graph.
+
+    Args:
+        model (nn.Module): Eager model in eval mode
+        features (torch.Tensor): Example node features [n_regions, n_timepoints]
+        edge_index (torch.Tensor): Example graph edges [2, n_edges]
+        backend (str): One of 'eager', 'torchscript' or 'onnx'
+        quantize (bool): Apply dynamic int8 quantization to the fc head
+        export_dir (str, optional): Directory to also save exported graph files to
+
+    Returns:
+        callable: Function mapping (features, edge_index) to a numpy matrix
+    """
+    if backend not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend: {backend}, expected one of {INFERENCE_BACKENDS}")
+
     try:
-        # Preprocess
-        features, edge_index, num_regions = preprocess_fmri(nifti_path)
+        model = model.cpu().eval()
+        features = features.cpu()
+        edge_index = edge_index.cpu()
+
+        if backend == 'onnx':
+            # Dynamically quantized torch modules cannot be exported to ONNX,
+            # so quantization is applied by ONNX Runtime on the exported graph
+            import onnxruntime as ort
+
+            session = ort.InferenceSession(
+                _export_onnx(model, features, edge_index, quantize, export_dir),
+                providers=['CPUExecutionProvider']
+            )
+            logger.info("Exported model to ONNX Runtime graph")
+
+            def run(x, edges):
+                return session.run(None, {
+                    'features': x.cpu().numpy(),
+                    'edge_index': edges.cpu().numpy()
+                })[0]
+            return run
+
+        if quantize:
+            model = quantize_model(model)
+
+        if backend == 'torchscript':
+            # Traced graph is specialised to the number of regions in `features`
+            with torch.no_grad():
+                model = torch.jit.trace(model, (features, edge_index), check_trace=False)
+            model = torch.jit.freeze(model)
+            if export_dir:
+                os.makedirs(export_dir, exist_ok=True)
+                script_path = os.path.join(export_dir, 'gcn_connectivity.pt')
+                model.save(script_path)
+                logger.info(f"Saved TorchScript graph: {script_path}")
+
+        return _eager_runner(model)
+    except ImportError as e:
+        logger.error(f"Missing dependency for {backend} backend: {str(e)}")
+        raise
+    except Exception as e:
+        logger.error(f"Export error for {backend} backend: {str(e)}")
+        raise
 
-        # Load model
+def check_backend_accuracy(model, run_backend, features, edge_index, n_runs=10, n_warmup=3):
+    """
+    Compare an inference backend against the eager model.
+
+    Args:
+        model (nn.Module): Reference eager model in eval mode
+        run_backend (callable): Function returned by build_inference_backend
+        features (torch.Tensor): Node features [n_regions, n_timepoints]
+        edge_index (torch.Tensor): Graph edges [2, n_edges]
+        n_runs (int): Number of timed runs per model
+        n_warmup (int): Untimed runs first, so TorchScript can optimize its graph
+
+    Returns:
+        dict: Max/mean absolute deviation of the connectivity matrix and
+            mean latency (ms) of the eager model and the backend
+    """
+    if n_runs < 1:
+        raise ValueError(f"n_runs must be at least 1, got {n_runs}")
+
+    model = model.cpu().eval()
+    features = features.cpu()
+    edge_index = edge_index.cpu()
+
+    def timed(fn):
+        for _ in range(n_warmup):
+            fn()
+        start = time.perf_counter()
+        for _ in range(n_runs):
+            output = fn()
+        return output, (time.perf_counter() - start) * 1000 / n_runs
+
+    reference, eager_ms = timed(lambda: _eager_runner(model)(features, edge_index))
+    output, backend_ms = timed(lambda: run_backend(features, edge_index))
+
+    deviation = np.abs(np.asarray(output) - reference)
+    report = {
+        'max_abs_deviation': float(np.max(deviation)),
+        'mean_abs_deviation': float(np.mean(deviation)),
+        'eager_latency_ms': float(eager_ms),
+        'backend_latency_ms': float(backend_ms)
+    }
+    logger.info(
+        f"Backend accuracy: max abs deviation {report['max_abs_deviation']:.2e}, "
+        f"latency {eager_ms:.2f} ms (eager) vs {backend_ms:.2f} ms (backend)"
+    )
+    return report
+
+def get_inference_backend(model, features, edge_index, backend='eager', quantize=False,
+                          max_deviation=None):
+    """
+    Return a cached inference backend, building and checking it on first use.
+
+    Backends are cached per model object and input shape. The accuracy check
+    runs once when the backend is built, on the input that triggered the
+    build; the report is marked ``calibrated_on_build`` and describes that
+    input, not later ones. If the backend deviates from the eager model by
+    more than ``max_deviation``, a warning is logged and the eager model is
+    used instead.
+
+    Args:
+        model (nn.Module): Eager model in eval mode
+        features (torch.Tensor): Node features [n_regions, n_timepoints]
+        edge_index (torch.Tensor): Graph edges [2, n_edges]
+        backend (str): One of 'eager', 'torchscript' or 'onnx'
+        quantize (bool): Apply dynamic int8 quantization to the fc head
+        max_deviation (float, optional): Maximum allowed absolute deviation
+
+    Returns:
+        run_backend (callable): Function mapping (features, edge_index) to a numpy matrix
+        report (dict): Build-time accuracy report from check_backend_accuracy
+    """
+    def build():
+        run_backend = build_inference_backend(model, features, edge_index, backend, quantize)
+        report = check_backend_accuracy(model, run_backend, features, edge_index)
+        report['calibrated_on_build'] = True
+        report['calibration_shape'] = list(features.shape)
+        report['fallback_to_eager'] = (
+            max_deviation is not None and report['max_abs_deviation'] > max_deviation
+        )
+        if report['fallback_to_eager']:
+            logger.warning(
+                f"{backend} backend deviates from eager model by "
+                f"{report['max_abs_deviation']:.2e}, above allowed {max_deviation:.2e}. "
+                "Falling back to eager model."
+            )
+            run_backend = _eager_runner(model.cpu())
+        return run_backend, report
+
+    key = (model, backend, quantize, max_deviation) + tuple(features.shape)
+    run_backend, report = _cached(_backend_cache, key, build)
+    return run_backend, dict(report)
+
+def load_model(ipynb_path, num_regions, num_features):
+    """
+    Load a GCNConnectivity model, cached per weights source and input shape.
+
+    Reusing the same model object keeps eager and optimized backends on
+    identical weights across requests.
+
+    Args:
+        ipynb_path (str, optional): Path to .ipynb file
+        num_regions (int): Number of regions
+        num_features (int): Number of features (timepoints) per region
+
+    Returns:
+        model (nn.Module): Model in eval mode
+    """
+    def build():
         if ipynb_path and os.path.exists(ipynb_path):
             model, has_weights = parse_ipynb_model(ipynb_path)
             # Update model with correct dimensions
-            model = GCNConnectivity(num_regions, features.shape[1])
+            model = GCNConnectivity(num_regions, num_features)
             if not has_weights:
                 logger.warning("No pre-trained weights loaded. Results may be unreliable.")
         else:
-            model = GCNConnectivity(num_regions, features.shape[1])
+            model = GCNConnectivity(num_regions, num_features)
             logger.warning(
                 f"No .ipynb provided at {ipynb_path or 'None'}. Using untrained model."
             )
-        model.eval()
+        return model.eval()
+
+    return _cached(_model_cache, (ipynb_path, num_regions, num_features), build)
+
+def predict_connectivity(nifti_path, ipynb_path=None, backend='eager', quantize=False,
+                         max_deviation=None):
+    """
+    Predict connectivity matrix using model from .ipynb.
+
+    Args:
+        nifti_path (str): Path to NIfTI file
+        ipynb_path (str, optional): Path to .ipynb file
+        backend (str): Inference backend, one of 'eager', 'torchscript' or 'onnx'
+        quantize (bool): Apply dynamic int8 quantization to the fc head; the
+            GCNConv layers keep float weights on every backend
+        max_deviation (float, optional): Maximum allowed absolute deviation
+            from the eager model before falling back to eager inference
+
+    Returns:
+        dict: Connectivity matrix, metrics, heatmap. With an optimized
+            backend, ``metrics['backend']`` holds the build-time accuracy
+            report of that backend, not a check of this prediction.
+    """
+    try:
+        # Preprocess
+        features, edge_index, num_regions = preprocess_fmri(nifti_path)
+
+        # Load model
+        model = load_model(ipynb_path, num_regions, features.shape[1])
 
         # Predict
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model = model.to(device)
-        features = features.to(device)
-        edge_index = edge_index.to(device)
+        backend_report = None
+        if backend != 'eager' or quantize:
+            # Optimized backends run on CPU
+            run_backend, backend_report = get_inference_backend(
+                model, features, edge_index, backend, quantize, max_deviation
+            )
+            connectivity = run_backend(features, edge_index)
+        else:
+            device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+            model = model.to(device)
+            features = features.to(device)
+            edge_index = edge_index.to(device)
 
-        with torch.no_grad():
-            connectivity = model(features, edge_index)
-            connectivity = connectivity.cpu().numpy()
+            with torch.no_grad():
+                connectivity = model(features, edge_index)
+                connectivity = connectivity.cpu().numpy()
 
         # Validate
         validate_connectivity_matrix(connectivity, (num_regions, num_regions))
@@ -229,6 +552,8 @@ def predict_connectivity(nifti_path, ipynb_path=None):
             'max': float(np.max(connectivity_flat)),
             'min': float(np.min(connectivity_flat))
         }
+        if backend_report is not None:
+            metrics['backend'] = backend_report
 
         # Heatmap
         plt.figure(figsize=(8, 6))
@@ -251,6 +576,8 @@ def predict_connectivity(nifti_path, ipynb_path=None):
 
 # Main execution
 if __name__ == "__main__":
+    from google.colab import files
+
     # Upload NIfTI file
     print("Please upload your fMRI NIfTI file (.nii or .nii.gz):")
     uploaded_nifti = files.upload()
@@ -0,0 +1,115 @@
+import os
+import sys
+
+import pytest
+
+torch = pytest.importorskip('torch')
+pytest.importorskip('torch_geometric')
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from models.functional_connectivity import (
+    GCNConnectivity,
+    build_inference_backend,
+    check_backend_accuracy,
+    clear_caches,
+    get_inference_backend,
+    load_model,
+    _export_onnx
+)
+
+NUM_REGIONS = 21
+NUM_TIMEPOINTS = 50
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    clear_caches()
+    yield
+    clear_caches()
+
+
+@pytest.fixture
+def graph():
+    torch.manual_seed(0)
+    features = torch.randn(NUM_REGIONS, NUM_TIMEPOINTS)
+    edge_index = torch.randint(0, NUM_REGIONS, (2, 120))
+    model = GCNConnectivity(NUM_REGIONS, NUM_TIMEPOINTS).eval()
+    return model, features, edge_index
+
+
+@pytest.mark.parametrize('backend', ['eager', 'torchscript', 'onnx'])
+@pytest.mark.parametrize('quantize', [False, True])
+def test_backend_matches_eager(graph, backend, quantize):
+    if backend == 'onnx':
+        pytest.importorskip('onnxruntime')
+    model, features, edge_index = graph
+
+    run_backend = build_inference_backend(model, features, edge_index, backend, quantize)
+    report = check_backend_accuracy(model, run_backend, features, edge_index, n_runs=1)
+
+    assert report['max_abs_deviation'] < (5e-2 if quantize else 1e-5)
+    if quantize:
+        assert report['max_abs_deviation'] > 0
+    # A different edge set must reuse the same graph
+    other_edges = torch.randint(0, NUM_REGIONS, (2, 80))
+    report = check_backend_accuracy(model, run_backend, features, other_edges, n_runs=1)
+    assert report['max_abs_deviation'] < (5e-2 if quantize else 1e-5)
+
+
+def test_backend_falls_back_to_eager(graph):
+    model, features, edge_index = graph
+
+    run_backend, report = get_inference_backend(
+        model, features, edge_index, 'torchscript', quantize=True, max_deviation=0.0
+    )
+
+    assert report['fallback_to_eager']
+    with torch.no_grad():
+        expected = model(features, edge_index).numpy()
+    assert (run_backend(features, edge_index) == expected).all()
+    assert get_inference_backend(
+        model, features, edge_index, 'torchscript', quantize=True, max_deviation=0.0
+    )[0] is run_backend
+
+
+def test_onnx_quantizes_only_fc(graph):
+    onnx = pytest.importorskip('onnx')
+    pytest.importorskip('onnxruntime')
+    model, features, edge_index = graph
+
+    onnx_graph = onnx.load_from_string(
+        _export_onnx(model, features, edge_index, quantize=True, export_dir=None)
+    ).graph
+
+    quantized = [node for node in onnx_graph.node if node.op_type == 'MatMulInteger']
+    assert len(quantized) == 1
+    assert any(name.startswith('fc.weight') for name in quantized[0].input)
+
+
+def test_backend_cache_is_per_model(graph):
+    _, features, edge_index = graph
+    first = GCNConnectivity(NUM_REGIONS, NUM_TIMEPOINTS).eval()
+    second = GCNConnectivity(NUM_REGIONS, NUM_TIMEPOINTS).eval()
+
+    run_first, report = get_inference_backend(first, features, edge_index, 'torchscript')
+    run_second, _ = get_inference_backend(second, features, edge_index, 'torchscript')
+
+    assert report['calibrated_on_build']
+    assert report['calibration_shape'] == [NUM_REGIONS, NUM_TIMEPOINTS]
+    assert not (run_first(features, edge_index) == run_second(features, edge_index)).all()
+
+
+def test_accuracy_check_without_warmup(graph):
+    model, features, edge_index = graph
+    run_backend = build_inference_backend(model, features, edge_index)
+
+    report = check_backend_accuracy(model, run_backend, features, edge_index, n_runs=1, n_warmup=0)
+
+    assert report['max_abs_deviation'] == 0
+
+
+def test_load_model_reuses_weights():
+    model = load_model(None, NUM_REGIONS, NUM_TIMEPOINTS)
+
+    assert load_model(None, NUM_REGIONS, NUM_TIMEPOINTS) is model
+    assert load_model(None, NUM_REGIONS, NUM_TIMEPOINTS + 1) is not model